@@ -0,0 +1,43 @@
+####################################################################################################
+##
+## This program measures the startup time of the packages and the scripts started by TeamCity.
+## Every case is run in a fresh interpreter a number of times, and the best and median times are printed.
+##
+####################################################################################################
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+CASES = [
+    ("python (baseline)", ["-c", "pass"]),
+    ("import confluence", ["-c", "import confluence"]),
+    ("import jira_utils", ["-c", "import jira_utils"]),
+    ("createDesignReview.py usage", ["createDesignReview.py"]),
+    # What a real run loads before its first request: the classes it uses and the jira module the
+    # jira_utils.Client imports when it connects.
+    ("createDesignReview.py run", ["-c", "import createDesignReview, confluence, jira_utils; "
+                                         "confluence.Client; confluence.ContentUtils; jira_utils.Client; "
+                                         "import jira.client"]),
+]
+
+
+def time_case(arguments, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        # createDesignReview.py exits with usage help when given no arguments, before any deferred import.
+        subprocess.run([sys.executable] + arguments, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return min(timings), statistics.median(timings)
+
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    print("%-30s %10s %10s" % ("case", "best [ms]", "median [ms]"))
+    for name, arguments in CASES:
+        best, median = time_case(arguments, repeat)
+        print("%-30s %10.1f %10.1f" % (name, best * 1000, median * 1000))
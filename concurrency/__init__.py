@@ -0,0 +1 @@
+from concurrency.single_flight import *
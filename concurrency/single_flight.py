@@ -0,0 +1,42 @@
+###################################
+## This module supplies single-flight calls: concurrent identical calls share one execution and its result.
+## It is shared by the REST clients of the Confluence, TeamCity and other packages.
+##
+###################################
+import threading
+from concurrent.futures import Future
+
+__all__ = ['SingleFlight']
+
+
+class SingleFlight():
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> Future of the call in flight
+        self._calls = dict()
+
+    def do(self, key, function):
+        """ Call function and return its result, unless a call with the same key is already in flight.
+            In that case wait for that call and return its result (or raise its exception) instead.
+            Results are not kept once the call is done, so later calls with the same key run again.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+
+        if not leader:
+            return call.result()
+
+        try:
+            result = function()
+        except BaseException as error:
+            call.set_exception(error)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
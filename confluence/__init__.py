@@ -1,2 +1,18 @@
-from confluence.client import *
-from confluence.content_utils import *
+# The submodules pull in heavy dependencies (oauth2, tlslite, ElementTree), so they are only imported
+# when one of their names is used for the first time.
+from lazy_import import make_lazy
+
+_lazy_names = {
+    'SignatureMethod_RSA_SHA1': 'confluence.client',
+    'Client': 'confluence.client',
+    'ContentUtils': 'confluence.content_utils',
+    'SpaceIndex': 'confluence.space_index',
+    'CompactIssue': 'confluence.report_renderer',
+    'ReportRenderer': 'confluence.report_renderer',
+}
+
+_lazy_submodules = ['client', 'content_utils', 'space_index', 'report_renderer']
+
+__all__ = list(_lazy_names)
+
+make_lazy(__name__)
@@ -1,7 +1,12 @@
 import base64
 import oauth2 as oauth
-from tlslite.utils import keyfactory
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+from urllib.parse import urlencode
+
+from concurrency import SingleFlight
 
 ##################################################################################
 # Python Interface for Confluence, supporting a subset of the full REST interface.
@@ -33,6 +38,9 @@ class SignatureMethod_RSA_SHA1(oauth.SignatureMethod):
 
     def sign(self, request, consumer, token):
         """Builds the base signature string."""
+        # tlslite is only needed when a request is actually signed
+        from tlslite.utils import keyfactory
+
         key, raw = self.signing_base(request, consumer, token)
         parsed_key = keyfactory.parsePrivateKey(self.private_key)
         signature = parsed_key.hashAndSign(bytes(raw, "utf-8"))
@@ -91,17 +99,64 @@ class Client:
         self._auth = oauth
         self._server_url = options['server']+"/rest/api/"
         self._spacekey = options['spacekey']
+        # Every thread gets its own oauth client, the underlying http connection is not thread safe.
+        # A thread keeps its client, and so its connection, for all its GET requests. Threads that only live
+        # for one task (e.g. of a ThreadPoolExecutor made per call) connect again every time.
+        self._local = threading.local()
+        # Identical GET requests made at the same time from several threads share one request
+        self._single_flight = SingleFlight()
 
         # Prepare the initial client
         self._set_client()
 
     def _set_client(self):
         # Setup a new client. We need to repeat the authentication for every POST request due to nonce handling.
+        # The new client opens a new connection, so every POST pays for connecting.
         consumer = oauth.Consumer(self._auth['consumer_key'], self._auth['consumer_secret'])
         access_token = oauth.Token(self._auth['access_token'], self._auth['access_token_secret'])
-        self._client = oauth.Client(consumer, access_token)
+        client = oauth.Client(consumer, access_token)
         SignatureMethod_RSA_SHA1.private_key = self._auth['key_cert']
-        self._client.set_signature_method(SignatureMethod_RSA_SHA1())
+        client.set_signature_method(SignatureMethod_RSA_SHA1())
+        self._local.client = client
+
+    @property
+    def _client(self):
+        # The client of the calling thread. Threads of a pool get a client on their first request.
+        if getattr(self._local, 'client', None) is None:
+            self._set_client()
+        return self._local.client
+
+    def _get(self, uri):
+        # GET a resource, sharing the request with other threads asking for the same uri at the same time
+        return self._single_flight.do(uri, lambda: self._client.request(uri, method="GET"))
+
+    def _get_json(self, uri):
+        # GET a resource and return the decoded json, raising an exception if Confluence returned an error.
+        resp, content = self._get(uri)
+        data = json.loads(content.decode("utf-8"))
+        if "statusCode" in data:
+            raise RuntimeError("Request for " + uri + " failed!\nStatusCode=" +
+                               str(data['statusCode']) + ", " + data.get('message', ''))
+        return data
+
+    def _next_uri(self, data):
+        # The uri of the next page of a paginated result, or None on the last page.
+        # The next link is relative to the base URL of Confluence.
+        links = data.get('_links', {})
+        if 'next' in links:
+            return links['base'] + links['next']
+        return None
+
+    def _get_results(self, uri, limit=200):
+        # Generator over the 'results' of a paginated GET resource, following the 'next' links of the pages.
+        # The server may return fewer results per page than the limit asked for.
+        separator = "&" if "?" in uri else "?"
+        uri = uri+separator+"limit="+str(limit)
+        while uri is not None:
+            data = self._get_json(uri)
+            for result in data['results']:
+                yield result
+            uri = self._next_uri(data)
 
     ## VERSION
     ##########
@@ -110,17 +165,21 @@ class Client:
         page_id = str(page_id)
 
         uri = self._server_url+"content/" + page_id + "/history?expand=lastUpdated"
-        resp, content = self._client.request(uri, method="GET")
+        resp, content = self._get(uri)
         data = json.loads(content.decode("utf-8"))
         return str(data['lastUpdated']['number'] + 1)
 
     ## PAGE
     #######
-    def update_page(self, page_id, title, body):
+    def update_page(self, page_id, title, body, version=None):
         # PUT new content on an existing page
+        # If the next version number is known already it can be given, saving a request for it.
         page_id = str(page_id)
 
-        next_version = self.get_next_page_version(page_id)
+        if version is None:
+            next_version = self.get_next_page_version(page_id)
+        else:
+            next_version = str(version)
         uri = self._server_url+"content/" + page_id
         data = {'type': 'page',
                 'title': title,
@@ -170,16 +229,90 @@ class Client:
         # print content
         return content
 
+    def get_space(self):
+        # Return the decoded json of the space of the client. Also used to connect a thread's client up front.
+        return self._get_json(self._server_url+"space/"+self._spacekey)
+
+    def get_page(self, page_id, expand="version,ancestors"):
+        # Return the decoded json of a page, without its body unless asked for in expand.
+        page_id = str(page_id)
+
+        return self._get_json(self._server_url+"content/" + page_id + "?expand=" + expand)
+
+    def find_pages_by_title(self, title, expand="version,ancestors"):
+        # Return the list of pages of the space with exactly this title (at most one, titles are unique in a space).
+        uri = self._server_url+"content?"+urlencode({'spaceKey': self._spacekey, 'title': title, 'type': 'page',
+                                                     'expand': expand})
+        return list(self._get_results(uri))
+
     def get_page_content(self, page_id):
         page_id = str(page_id)
 
         uri = self._server_url+"content/" + page_id + "?expand=body.storage"
-        resp, content = self._client.request(uri, method="GET")
+        resp, content = self._get(uri)
         data = json.loads(content.decode("utf-8"))
 
         # print "CONTENT:\n"+content+"\n"
         return data['body']['storage']['value']
 
+    def get_child_pages(self, page_id, expand="version"):
+        # Generator over the direct child pages of a page.
+        page_id = str(page_id)
+
+        uri = self._server_url+"content/" + page_id + "/child/page?expand=" + expand
+        return self._get_results(uri)
+
+    def get_root_pages(self, expand="version"):
+        # Generator over the pages at the top of the page tree of the space.
+        uri = self._server_url+"space/" + self._spacekey + "/content/page?depth=root&expand=" + expand
+        return self._get_results(uri)
+
+    def get_pages(self, page_ids, expand="body.storage,version", max_workers=8):
+        # Generator over the content of many pages, fetched concurrently. Yields (page id, content, error) tuples
+        # in the order the requests complete, content being the decoded json of the page, or None and error the
+        # exception if the page could not be fetched. At most max_workers requests are in flight, and requests
+        # not started yet are cancelled when the generator is closed early.
+        page_ids = iter(page_ids)
+        jobs = dict()
+
+        def submit(count):
+            for page_id in islice(page_ids, count):
+                jobs[executor.submit(self._get_json, self._server_url+"content/" + str(page_id) + "?expand=" +
+                                     expand)] = str(page_id)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            try:
+                submit(max_workers)
+                while jobs:
+                    done, _ = wait(jobs, return_when=FIRST_COMPLETED)
+                    submit(len(done))
+                    for job in done:
+                        page_id = jobs.pop(job)
+                        error = job.exception()
+                        yield page_id, None if error is not None else job.result(), error
+            finally:
+                for job in jobs:
+                    job.cancel()
+
+    ## SEARCH
+    #########
+    def search(self, cql, expand=None, limit=100):
+        # Generator over the content matching a CQL query. Result pages are followed with their 'next' links,
+        # and the next page is already requested while the current one is being consumed.
+        query = {'cql': cql, 'limit': limit}
+        if expand is not None:
+            query['expand'] = expand
+        uri = self._server_url+"content/search?"+urlencode(query)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            pending = executor.submit(self._get_json, uri)
+            while pending is not None:
+                data = pending.result()
+                next_uri = self._next_uri(data)
+                pending = executor.submit(self._get_json, next_uri) if next_uri is not None else None
+                for result in data['results']:
+                    yield result
+
     def add_attachment(self, page_id, filename, comment):
         # PUT new content on an existing page
         page_id = str(page_id)
@@ -218,13 +351,22 @@ class Client:
         resp, content = self._client.request(uri, headers=self._headers, body=data_json, method="POST")
         return content
 
+    def get_labels(self, page_id, prefix="global"):
+        # Return the list of label names of some content page. Only labels with the given prefix are returned,
+        # use prefix=None to get all of them.
+        page_id = str(page_id)
+
+        uri = self._server_url+"content/"+page_id+"/label"
+        return [label['name'] for label in self._get_results(uri)
+                if prefix is None or label['prefix'] == prefix]
+
     def delete_label(self, page_id, label=None):
         # Delete a single label of some content page
         if label is None:
             return "No label to delete specified"
 
         page_id = str(page_id)
-        uri = self._server_url+"content/"+page_id+"/label?name="+label
+        uri = self._server_url+"content/"+page_id+"/label?"+urlencode({'name': label})
 
         resp, content = self._client.request(uri, headers=self._headers, method="DELETE")
         return content
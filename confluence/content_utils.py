@@ -7,14 +7,70 @@ import xml.etree.ElementTree as ET
 import json
 import time
 import datetime
-import re
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import span, traced
 
 class ContentUtils():
     def __init__(self, client):
         self._client = client
 
+    @traced("labelling")
     def set_labels(self, page_id, labels=None):
         self._client.set_labels(page_id=page_id, labels=labels)
+
+    @traced("labelling")
+    def sync_labels(self, page_labels, max_workers=8):
+        """ Bring the labels of many pages to a desired state with as few requests as possible.
+            The current labels of all pages are fetched concurrently, and only the missing labels are added
+            and the surplus labels removed.
+
+            Arguments:
+                page_labels: dictionary mapping page id to the list of labels the page should have
+                max_workers: maximum number of requests in flight at the same time
+
+            Returns a dictionary mapping page id to a tuple (added labels, removed labels).
+            Raises RuntimeError listing the failed changes if Confluence refused any of them.
+        """
+        # Confluence stores labels in lower case and without spaces
+        desired = dict()
+        for page_id, labels in page_labels.items():
+            desired[str(page_id)] = set(label.replace(" ", "_").lower() for label in labels)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            current = dict(zip(desired, executor.map(self._client.get_labels, desired)))
+
+            changes = dict()
+            jobs = list()
+            for page_id, labels in desired.items():
+                add = sorted(labels - set(current[page_id]))
+                remove = sorted(set(current[page_id]) - labels)
+                changes[page_id] = (add, remove)
+                if add:
+                    jobs.append(("adding " + ", ".join(add) + " to page " + page_id,
+                                 executor.submit(self._client.set_labels, page_id, add)))
+                for label in remove:
+                    jobs.append(("removing " + label + " from page " + page_id,
+                                 executor.submit(self._client.delete_label, page_id, label)))
+
+            errors = list()
+            for change, job in jobs:
+                error = self._response_error(job.result())
+                if error is not None:
+                    errors.append(change + ": " + error)
+        if errors:
+            raise RuntimeError("Labels were not changed!\n" + "\n".join(errors))
+        return changes
+
+    def _response_error(self, content):
+        # Return the error message of a Confluence response, or None if the request succeeded.
+        # Successful DELETE requests have an empty response.
+        if not content:
+            return None
+        status = json.loads(content.decode("utf-8"))
+        if isinstance(status, dict) and "statusCode" in status:
+            return "StatusCode=" + str(status['statusCode']) + ", " + status.get('message', '')
+        return None
         
     def get_page_id(self, content):
         """
@@ -39,7 +95,8 @@ class ContentUtils():
         template_page_id = str(template_page_id)
 
         # Get template page
-        template_page = self._client.get_page_content(template_page_id)
+        with span("template fetch"):
+            template_page = self._client.get_page_content(template_page_id)
 
         # print "TEMPLATE PAGE:\n"+template_page+"\n"
         # substitute
@@ -47,10 +104,11 @@ class ContentUtils():
         body = template.substitute(substitutions)
 
         # inject page
-        return self._client.create_page(parent_page_id=parent_page_id,
-                                title=title,
-                                body=body
-                                )
+        with span("page creation"):
+            return self._client.create_page(parent_page_id=parent_page_id,
+                                    title=title,
+                                    body=body
+                                    )
 
     def _field_handler(self, element, field, issue):
         """ Internal service function offering interpretations of a set of known fields.
@@ -125,6 +183,7 @@ class ContentUtils():
             print("Field '%s' specified for which I don't know how to handle it, dumping a default look and hope for the best" % field)
             element.text = "Unknown field type"
 
+    @traced("table rendering")
     def create_jira_issue_table(self, issues, fields, titles):
         """ This function takes a list of fields and a list of JIRA issues, and returns a table in
             Confluence formatted code, ready for inclusion on a page.
@@ -158,48 +217,223 @@ class ContentUtils():
                 # Side effect function
                 self._field_handler(ET.SubElement(tr, 'td'), field, issue)
         return ET.tostring(table)
+
+    def split_jira_issue_table(self, title, issues, fields, titles, max_size=1000000):
+        """ This function makes a table like create_jira_issue_table, but splits it over child pages when the
+            rendered table is larger than max_size characters. Big pages are slow to save and to view.
+
+            Arguments:
+                title: title of the page the table is for, the child pages are named after it
+                issues, fields, titles: as for create_jira_issue_table
+                max_size: largest table (in characters of storage format) to put on a single page
+
+            Returns a tuple (content, child_pages). content is the table itself when it is small enough, otherwise
+            an index linking to the child pages. child_pages is a list of (title, body) tuples of the pages to create
+            below the page the content goes on, see create_child_pages. It is empty when the table was not split.
+        """
+        tables = self._split_issue_tables(list(issues), fields, titles, max_size)
+        if len(tables) == 1:
+            return tables[0], []
+
+        child_pages = [("%s (%d of %d)" % (title, part + 1, len(tables)), table.decode('UTF-8'))
+                       for part, table in enumerate(tables)]
+        # Links by title work before the child pages exist, so the index can be published first
+        ul = ET.Element('ul')
+        for child_title, body in child_pages:
+            link = ET.SubElement(ET.SubElement(ul, 'li'), 'ac:link')
+            ET.SubElement(link, 'ri:page', {'ri:content-title': child_title})
+        return ET.tostring(ul), child_pages
+
+    def _split_issue_tables(self, issues, fields, titles, max_size):
+        # Split into as many parts as the size suggests, and split again the parts that are still too big
+        table = self.create_jira_issue_table(issues, fields, titles)
+        if len(table) <= max_size or len(issues) <= 1:
+            return [table]
+        parts = -(-len(table) // max_size)
+        part_length = -(-len(issues) // parts)
+        tables = []
+        for start in range(0, len(issues), part_length):
+            tables.extend(self._split_issue_tables(issues[start:start + part_length], fields, titles, max_size))
+        return tables
+
+    @traced("page creation")
+    def create_child_pages(self, parent_page_id, child_pages, max_workers=8):
+        """ Create the (title, body) pages returned by split_jira_issue_table below the parent page.
+            The pages are created concurrently. Returns the content returned for each page, in order.
+            Raises RuntimeError listing the pages Confluence refused, after all pages were tried.
+        """
+        parent_page_id = str(parent_page_id)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            jobs = [(child_title, executor.submit(self._client.create_page, parent_page_id, child_title, body))
+                    for child_title, body in child_pages]
+            contents = [job.result() for child_title, job in jobs]
+        errors = []
+        for (child_title, job), content in zip(jobs, contents):
+            error = self._response_error(content)
+            if error is not None:
+                errors.append(child_title + ": " + error)
+        if errors:
+            raise RuntimeError("Child pages were not created!\n" + "\n".join(errors))
+        return contents
     
-    def create_table_from_nested_list(self, nestedList):
+    def _xml_text(self, value):
+        """ Return the escaped XML text of a table cell value """
+        value_type = type(value)
+        if value_type is int or value_type is float:
+            return str(value)
+        text = str(value)
+        if "&" in text:
+            text = text.replace("&", "&amp;")
+        if "<" in text:
+            text = text.replace("<", "&lt;")
+        if ">" in text:
+            text = text.replace(">", "&gt;")
+        return text
+
+    def _element(self, tag, text):
+        """ Return an element holding the escaped text, self-closing when empty as ElementTree writes it """
+        text = self._xml_text(text)
+        if not text:
+            return tag + ' />'
+        return tag + '>' + text + '</' + tag.split(' ', 1)[0][1:] + '>'
+
+    def _table_rows(self, nestedList, reverse):
+        """ Split table data into the header row and an iterator over the data rows.
+            Accepted are nested lists, 2-D NumPy arrays and column data: a dictionary of column name to column
+            values, or a pandas-like data frame with 'columns'.
+        """
+        if hasattr(nestedList, 'columns') or isinstance(nestedList, dict):
+            header = list(nestedList.columns if hasattr(nestedList, 'columns') else nestedList.keys())
+            columns = [nestedList[name] for name in header]
+            # Series like columns are converted to arrays, which reverse as a view
+            columns = [column.to_numpy() if hasattr(column, 'to_numpy') else column for column in columns]
+            if reverse:
+                columns = [reversed(column) for column in columns]
+            return header, zip(*columns)
+
+        if hasattr(nestedList, 'ndim'):
+            rows = nestedList[1:]
+            if reverse:
+                rows = rows[::-1]
+            return nestedList[0].tolist(), (row.tolist() for row in rows)
+
+        if not hasattr(nestedList, '__len__'):
+            # A row iterator has to be read fully to be reversed
+            nestedList = list(nestedList) if reverse else iter(nestedList)
+            if not reverse:
+                return next(nestedList), nestedList
+        if reverse:
+            return nestedList[0], (nestedList[row] for row in range(len(nestedList) - 1, 0, -1))
+        return nestedList[0], (nestedList[row] for row in range(1, len(nestedList)))
+
+    @traced("table rendering")
+    def create_table_from_nested_list(self, nestedList, reverse=True, out=None):
         """ This function takes a nested list and returns a table in
             Confluence formatted code, ready for inclusion on a page.
             The header column and row is highlighted(gray background). 
 
             Arguments:
-                nestedList: a two dimensional nested list.
+                nestedList: a two dimensional nested list with the header in the first row, a 2-D NumPy array
+                            or column data (a dictionary of column name to values, or a pandas-like data frame).
+                reverse: put the data rows in reverse order (last row first), as done for sprint tables.
+                out: optional file-like object the table is written to row by row instead of being returned.
         """
-        
-        table = ET.Element('table')
-        colgroup = ET.SubElement(table, 'colgroup')
-        tbody = ET.SubElement(table, 'tbody')
-        tr = ET.SubElement(tbody, 'tr')
+        header, rows = self._table_rows(nestedList, reverse)
 
-        for release in range(0, len(nestedList[0])):
-            ET.SubElement(colgroup, 'col')
-            th = ET.SubElement(tr, 'th', attrib={'style':'text-align: left;'})
-            span = ET.SubElement(th, 'span', attrib={'class': 'jim-table-header-content'})
-            span.text = nestedList[0][release]
-        for sprints in range(len(nestedList)-1, 0, -1):
-            tr = ET.SubElement(tbody,'tr')
-            for release in range(0, len(nestedList[0])):
-                if release == 0:
-                    ET.SubElement(tr, 'th').text = str(nestedList[sprints][release])
-                else:
-                    ET.SubElement(tr, 'td').text = str(nestedList[sprints][release])
-        return ET.tostring(table)
-    
-    def create_js_table_from_nested_list(self, nestedList):
+        def table():
+            yield '<table><colgroup>' + '<col />' * len(header) + '</colgroup><tbody><tr>'
+            for title in header:
+                yield ('<th style="text-align: left;">' +
+                       self._element('<span class="jim-table-header-content"', title) + '</th>')
+            yield '</tr>'
+            for row in rows:
+                cells = iter(row)
+                yield ('<tr>' + self._element('<th', next(cells)) +
+                       ''.join([self._element('<td', cell) for cell in cells]) + '</tr>')
+            yield '</tbody></table>'
+
+        if out is None:
+            # Like ElementTree.tostring, characters outside ascii become character references
+            return ''.join(table()).encode('ascii', 'xmlcharrefreplace')
+
+        for part in table():
+            out.write(part)
+
+    _js_repr_types = {int, float, bool, str}
+    _js_repr_words = ("nan", "inf", "True", "False")
+
+    def _js_float(self, value):
+        if value != value:
+            return "NaN"
+        if value in (float('inf'), float('-inf')):
+            return "Infinity" if value > 0 else "-Infinity"
+        return repr(value)
+
+    def _js_literal(self, value):
+        """ Return the Javascript literal of a Python or NumPy value.
+            Booleans become true/false, NaN and the string 'N_a_N' become NaN, None becomes null,
+            lists, tuples and arrays become Javascript arrays.
+        """
+        value_type = type(value)
+        if value_type is str:
+            return "NaN" if value == 'N_a_N' else repr(value)
+        if value_type is float:
+            return self._js_float(value)
+        if value_type is bool:
+            return "true" if value else "false"
+        if value_type is int:
+            return str(value)
+        if value is None:
+            return "null"
+        if hasattr(value, 'tolist'):
+            # NumPy scalars and arrays are converted to the equivalent Python values
+            return self._js_literal(value.tolist())
+        if value_type in (list, tuple):
+            types = set(map(type, value))
+            if types <= self._js_repr_types:
+                # Rows of plain values (the common case for charts) can use the fast built-in repr.
+                text = repr(list(value))
+                if str not in types:
+                    # No strings the replacements could touch
+                    text = text.replace("nan", "NaN").replace("inf", "Infinity")
+                    return text.replace("True", "true").replace("False", "false")
+                if 'N_a_N' not in value and not any(word in text for word in self._js_repr_words):
+                    return text
+            return "[" + ", ".join(map(self._js_literal, value)) + "]"
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        if isinstance(value, int):
+            return str(int(value))
+        if isinstance(value, float):
+            return self._js_float(float(value))
+        if isinstance(value, str):
+            return self._js_literal(str(value))
+        return repr(str(value))
+
+    @traced("table rendering")
+    def create_js_table_from_nested_list(self, nestedList, out=None):
         """ This function takes a nested list and returns a table in
             Javascript formated code, ready for inclusion on a page in a html element with js script section..
+            Values are converted to Javascript literals in a single pass, see _js_literal.
 
             Arguments:
-                nestedList: a two dimensional nested list.
+                nestedList: a two dimensional nested list, a 2-D NumPy array or any iterable of rows.
+                out: optional file-like object the table is written to row by row instead of being returned.
         """
+        if hasattr(nestedList, 'ndim') and nestedList.ndim == 2:
+            # Convert one row at a time, the whole array is never held as Python objects
+            rows = (self._js_literal(row.tolist()) for row in nestedList)
+        else:
+            rows = map(self._js_literal, nestedList)
+
+        if out is None:
+            return ",".join(rows)
 
-        table = ",".join(map(str, nestedList))
-        table = re.sub("True", "true", table, flags=re.DOTALL)
-        table = re.sub("False", "false", table, flags=re.DOTALL)
-        table = re.sub("'N_a_N'", "NaN", table, flags=re.DOTALL)
-        return table
+        separator = ""
+        for row in rows:
+            out.write(separator)
+            out.write(row)
+            separator = ","
     
     def create_link_to_teamcity(self, template_page, targetUrl):
         teamcityUrl = "http://kbn-tc-teamcity/viewType.html?buildTypeId=AGILE_HipAesRemainingEstimate41";
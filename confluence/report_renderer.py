@@ -0,0 +1,106 @@
+###################################
+## This module supplies rendering of many page tables at once on all cores, for reports with many big tables.
+##
+###################################
+import os
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+
+from confluence.content_utils import ContentUtils
+
+# The raw Jira fields each table field is rendered from
+_RAW_FIELDS = {'type': ['issuetype'],
+               'key': []}
+
+
+def _to_resource(value):
+    """ Give attribute access to a raw Jira json value, the way the jira module resources do """
+    if isinstance(value, dict):
+        return SimpleNamespace(**dict((name, _to_resource(item)) for name, item in value.items()))
+    if isinstance(value, list):
+        return [_to_resource(item) for item in value]
+    return value
+
+
+class CompactIssue():
+    """ Stand-in for a jira Issue holding only the key and the raw fields needed for a table.
+        It is cheap to pickle, and offers the key, raw and fields attributes create_jira_issue_table uses.
+    """
+    def __init__(self, key, raw_fields):
+        self.key = key
+        self.raw = {'fields': raw_fields}
+        self._fields = None
+
+    @property
+    def fields(self):
+        if self._fields is None:
+            self._fields = _to_resource(self.raw['fields'])
+        return self._fields
+
+    def __getstate__(self):
+        return (self.key, self.raw['fields'])
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    @classmethod
+    def from_issue(cls, issue, fields):
+        raw = issue.raw['fields']
+        raw_fields = dict()
+        for field in fields.split(','):
+            for name in _RAW_FIELDS.get(field, [field]):
+                raw_fields[name] = raw.get(name)
+        return cls(issue.key, raw_fields)
+
+
+def _render_table(job):
+    # Runs in a worker process
+    kind, arguments = job
+    utils = ContentUtils(None)
+    if kind == 'issues':
+        return utils.create_jira_issue_table(*arguments)
+    return utils.create_table_from_nested_list(*arguments)
+
+
+class ReportRenderer():
+    def __init__(self, processes=None):
+        """ Arguments:
+                processes: number of worker processes, defaults to the number of cores
+        """
+        self._processes = processes or os.cpu_count()
+        self._jobs = []
+
+    def add_issue_table(self, issues, fields, titles):
+        """ Queue a table as made by ContentUtils.create_jira_issue_table. Returns the index of the table. """
+        compact = [CompactIssue.from_issue(issue, fields) for issue in issues]
+        self._jobs.append((len(compact) * len(fields.split(',')), ('issues', (compact, fields, titles))))
+        return len(self._jobs) - 1
+
+    def add_nested_list_table(self, nestedList, reverse=True):
+        """ Queue a table as made by ContentUtils.create_table_from_nested_list. Returns the index of the table.
+            The table data is sent to a worker process, so row iterators are not accepted.
+        """
+        if hasattr(nestedList, 'columns') or isinstance(nestedList, dict):
+            # Column data: the number of columns times the length of the columns
+            columns = list(nestedList.columns if hasattr(nestedList, 'columns') else nestedList.keys())
+            size = len(columns) * len(nestedList[columns[0]]) if columns else 0
+        elif hasattr(nestedList, 'ndim'):
+            size = nestedList.size
+        elif hasattr(nestedList, '__len__'):
+            size = len(nestedList) * len(nestedList[0]) if len(nestedList) else 0
+        else:
+            raise TypeError('Table data must be a nested list, an array or column data, not an iterator...')
+        self._jobs.append((size, ('nested', (nestedList, reverse))))
+        return len(self._jobs) - 1
+
+    def render(self):
+        """ Render all queued tables in the worker processes and return them in the order they were added.
+            The biggest tables are started first, so the report takes about as long as its biggest table.
+        """
+        jobs, self._jobs = self._jobs, []
+        if not jobs:
+            return []
+        order = sorted(range(len(jobs)), key=lambda index: jobs[index][0], reverse=True)
+        with ProcessPoolExecutor(max_workers=min(self._processes, len(jobs))) as executor:
+            futures = dict((index, executor.submit(_render_table, jobs[index][1])) for index in order)
+            return [futures[index].result() for index in range(len(jobs))]
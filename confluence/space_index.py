@@ -0,0 +1,145 @@
+###################################
+## This module supplies an index of the pages in a Confluence space, used to look up pages by title
+## and to create or update pages without knowing their page id beforehand.
+##
+###################################
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class SpaceIndex():
+    def __init__(self, client, root_page_id=None, max_workers=8):
+        """ Arguments:
+                client: confluence.Client of the space to index
+                root_page_id: only index the page tree below this page (the whole space if omitted)
+                max_workers: maximum number of child page requests in flight at the same time
+        """
+        self._client = client
+        self._root_page_id = None if root_page_id is None else str(root_page_id)
+        self._max_workers = max_workers
+        self._lock = threading.Lock()
+        self._crawled = False
+        # page id -> (title, parent page id, version number)
+        self._pages = dict()
+        # title -> page id. Titles are unique within a space.
+        self._titles = dict()
+
+    def _add(self, page_id, title, parent_page_id, version):
+        # Insert or update a single entry of the index
+        page_id = str(page_id)
+        with self._lock:
+            if page_id in self._pages:
+                old_title = self._pages[page_id][0]
+                if self._titles.get(old_title) == page_id:
+                    del self._titles[old_title]
+            self._pages[page_id] = (title, parent_page_id, version)
+            self._titles[title] = page_id
+
+    def _add_result(self, page, parent_page_id):
+        self._add(page['id'], page['title'], parent_page_id, page['version']['number'])
+
+    def _fetch_children(self, page_id):
+        children = list(self._client.get_child_pages(page_id))
+        for child in children:
+            self._add_result(child, page_id)
+        return [child['id'] for child in children]
+
+    def _add_page(self, page):
+        # Index a page fetched with its ancestors
+        parent_page_id = page['ancestors'][-1]['id'] if page.get('ancestors') else None
+        self._add_result(page, parent_page_id)
+
+    def crawl(self):
+        """ Rebuild the index of the page tree, dropping what was indexed before (e.g. pages deleted since).
+            Child pages of all pages found are requested concurrently.
+        """
+        with self._lock:
+            self._pages.clear()
+            self._titles.clear()
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            if self._root_page_id is None:
+                pending = set()
+                for page in self._client.get_root_pages():
+                    self._add_result(page, None)
+                    pending.add(executor.submit(self._fetch_children, page['id']))
+            else:
+                self._add_page(self._client.get_page(self._root_page_id))
+                pending = {executor.submit(self._fetch_children, self._root_page_id)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for job in done:
+                    for child_id in job.result():
+                        pending.add(executor.submit(self._fetch_children, child_id))
+        self._crawled = True
+
+    def _ensure_crawled(self):
+        if not self._crawled:
+            self.crawl()
+
+    def get_page_id(self, title, parent_page_id=None):
+        """ Return the page id of the page with the given title, or None if there is no such page.
+            If parent_page_id is given the page must also be a direct child of that page.
+        """
+        self._ensure_crawled()
+        with self._lock:
+            page_id = self._titles.get(title)
+            if page_id is None:
+                return None
+            if parent_page_id is not None and self._pages[page_id][1] != str(parent_page_id):
+                return None
+            return page_id
+
+    def get_ancestors(self, page_id):
+        """ Return the list of page ids from the top of the indexed tree down to the parent of page_id """
+        self._ensure_crawled()
+        ancestors = list()
+        with self._lock:
+            parent_page_id = self._pages[str(page_id)][1]
+            while parent_page_id is not None:
+                ancestors.insert(0, parent_page_id)
+                if parent_page_id not in self._pages:
+                    break
+                parent_page_id = self._pages[parent_page_id][1]
+        return ancestors
+
+    def remove(self, page_id):
+        """ Drop a page from the index, e.g. after it has been deleted """
+        page_id = str(page_id)
+        with self._lock:
+            if page_id in self._pages:
+                title = self._pages.pop(page_id)[0]
+                if self._titles.get(title) == page_id:
+                    del self._titles[title]
+
+    def upsert_page(self, parent_page_id, title, body):
+        """ Create the page if no page with that title exists in the space, otherwise update the existing page.
+            The index tells which of the two is needed and the version number for an update, so no extra
+            lookups are made for indexed pages. Titles the index does not know (e.g. pages outside the indexed
+            tree) are looked up in the whole space before creating. The index is kept up to date with the result.
+            Returns the content returned by Confluence, like create_page and update_page.
+            Raises RuntimeError if Confluence refused the page.
+        """
+        parent_page_id = str(parent_page_id)
+        self._ensure_crawled()
+        with self._lock:
+            page_id = self._titles.get(title)
+        if page_id is None:
+            for page in self._client.find_pages_by_title(title):
+                self._add_page(page)
+                page_id = str(page['id'])
+
+        if page_id is None:
+            content = self._client.create_page(parent_page_id=parent_page_id, title=title, body=body)
+        else:
+            with self._lock:
+                page_parent_id, version = self._pages[page_id][1:]
+            content = self._client.update_page(page_id=page_id, title=title, body=body, version=version + 1)
+
+        status = json.loads(content.decode("utf-8"))
+        if "statusCode" in status:
+            raise RuntimeError("Confluence page " + title + " was not saved!\nStatusCode=" +
+                               str(status['statusCode']) + ", " + status.get('message', ''))
+        self._add(status['id'], title, parent_page_id if page_id is None else page_parent_id,
+                  status['version']['number'])
+        return content
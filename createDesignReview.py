@@ -7,10 +7,10 @@ import confluence
 import datetime
 #JIRA
 import jira_utils
-import jira.client
 # Commandline options
+import argparse
 import json
-import sys
+import tracing
 
 
 def get_jira_client():
@@ -42,14 +42,17 @@ def get_confluence_client(spacekey):
     return confluence.Client(oauth=oauth_data, options=options)
 
 
-def create_design_review_page(config, variables):
-    jira_session = get_jira_client()
+def create_design_review_page(config, variables, jira_session=None, confluence_session=None):
+    # Clients already connected (e.g. kept by the report worker) can be passed in
+    if jira_session is None:
+        jira_session = get_jira_client()
     
     if 'spacekey' in config:
         spacekey = config['spacekey']
     else:
         spacekey = "<TEST SPACE KEY>"
-    confluence_session = get_confluence_client(spacekey)
+    if confluence_session is None:
+        confluence_session = get_confluence_client(spacekey)
     confluence_utils = confluence.ContentUtils(confluence_session)
 
     release = variables['RELEASE_VERSION']
@@ -59,25 +62,31 @@ def create_design_review_page(config, variables):
     titles = "Key,T,Summary,Status,Resolution,Reviewers,Reviews"
     fields = "key,type,summary,status,resolution,customfield_11400,customfield_11402"
     jql_str = 'project=GEAR AND type=Story AND resolution NOT IN ("Won\'t Fix", "Won\'t Do", "Duplicate") AND fixVersion=' + release
-    story_issues = jira_session.search_issues(jql_str,
-                                              startAt=0,
-                                              maxResults=100,
-                                              validate_query=True,
-                                              fields=fields,
-                                              expand="renderedFields",
-                                              json_result=None)
-
-    story_table = confluence_utils.create_jira_issue_table(story_issues, fields, titles).decode('UTF-8')
+    with tracing.span("jira search", jql=jql_str):
+        story_issues = jira_session.search_issues(jql_str,
+                                                  startAt=0,
+                                                  maxResults=100,
+                                                  validate_query=True,
+                                                  fields=fields,
+                                                  expand="renderedFields",
+                                                  json_result=None)
+
+    # Very large tables are moved to child pages, with an index on the review page
+    title = "Design Review - Release " + release
+    story_table, story_pages = confluence_utils.split_jira_issue_table(title + " - Stories", story_issues, fields, titles)
+    story_table = story_table.decode('UTF-8')
 
     jql_str = 'project=GEAR AND type=Bug AND fixVersion=' + release
-    bug_issues = jira_session.search_issues(jql_str,
-                                            startAt=0,
-                                            maxResults=100,
-                                            validate_query=True,
-                                            fields=fields,
-                                            expand="renderedFields",
-                                            json_result=None)
-    bug_table = confluence_utils.create_jira_issue_table(bug_issues, fields, titles).decode('UTF-8')
+    with tracing.span("jira search", jql=jql_str):
+        bug_issues = jira_session.search_issues(jql_str,
+                                                startAt=0,
+                                                maxResults=100,
+                                                validate_query=True,
+                                                fields=fields,
+                                                expand="renderedFields",
+                                                json_result=None)
+    bug_table, bug_pages = confluence_utils.split_jira_issue_table(title + " - Bugs", bug_issues, fields, titles)
+    bug_table = bug_table.decode('UTF-8')
 
     variables['BUGS_DONE_TABLE'] = bug_table
     variables['STORIES_DONE_TABLE'] = story_table
@@ -85,13 +94,14 @@ def create_design_review_page(config, variables):
     # Generate the page
     content = confluence_utils.generate_page_from_template(parent_page_id=config['parent_page_id'],
                                                            template_page_id=config['template_page_id'],
-                                                           title="Design Review - Release "+release,
+                                                           title=title,
                                                            substitutions=variables)
     
     created_page_id = confluence_utils.get_page_id(content)
     # The label in the template does not get propagated to the page instances
     # Therefore we need to add that label manually
     confluence_utils.set_labels(page_id=created_page_id, labels=["design-review"])
+    confluence_utils.create_child_pages(created_page_id, story_pages + bug_pages)
     
     return content
 
@@ -125,30 +135,42 @@ def print_status(status):
 if __name__ == "__main__":
     # The program takes exactly one argument:
     #  A json file containing two dictionaries, configuring the program page ids, and variables for the page.
-    # Argument check
-    if len(sys.argv) < 2:
-        print(sys.argv[0] + ' <json file>')
-        print('The json file must be formatted like this:"')
-        print('{')
-        print('  config":{')
-        print('    "template_page_id" : 61210645,')
-        print('    "parent_page_id"   : 61210633,')
-        print('    "test_mode"        : 0, (optional, only used for test)')
-        print('    "spacekey"        : "<SPACEKEY>"')
-        print('  },')
-        print('  variables": {')
-        print('    "REVIEW_DATE": "2017-03-02 22:49:14",')
-        print('    "RELEASE_VERSION": "4.1.0"')
-        print('  }')
-        print('}')
-        sys.exit(1)
-
-    fp = open(sys.argv[1], "r")
+    parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, epilog='''
+The json file must be formatted like this:
+{
+  "config":{
+    "template_page_id" : 61210645,
+    "parent_page_id"   : 61210633,
+    "test_mode"        : 0, (optional, only used for test)
+    "spacekey"        : "<SPACEKEY>"
+  },
+  "variables": {
+    "REVIEW_DATE": "2017-03-02 22:49:14",
+    "RELEASE_VERSION": "4.1.0"
+  }
+}''')
+    parser.add_argument('json_file', help='the design review configuration')
+    parser.add_argument('--trace', metavar='FILE',
+                        help='write a timeline of the phases of the run (Chrome trace format) and print a summary')
+    parser.add_argument('--profile', metavar='DIR', help='also write a cProfile dump per phase to the directory')
+    arguments = parser.parse_args()
+    trace_file = arguments.trace
+    profile_dir = arguments.profile
+    if trace_file or profile_dir:
+        tracer = tracing.enable(profile_dir=profile_dir)
+
+    fp = open(arguments.json_file, "r")
     data = json.load(fp)
     if 'test_mode' in data['config'] and data['config']['test_mode']:
         data['variables'] = generate_test_data()
 
     print("Creating a new design review page for release %s" % data['variables']['RELEASE_VERSION'])
-    status = create_design_review_page(config=data['config'], variables=data['variables'])
-    
+    with tracing.span("design review"):
+        status = create_design_review_page(config=data['config'], variables=data['variables'])
+
+    if trace_file or profile_dir:
+        print(tracer.summary())
+        if trace_file:
+            tracer.write_chrome_trace(trace_file)
+
     print_status(status)
\ No newline at end of file
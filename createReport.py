@@ -0,0 +1,40 @@
+####################################################################################################
+##
+## This program creates the Confluence report pages described by a json report configuration,
+## see report/engine.py for the format and designreport.json for an example.
+##
+####################################################################################################
+import argparse
+import json
+
+import report
+import tracing
+from createDesignReview import get_jira_client, get_confluence_client, print_status
+
+
+# Create the pages of a report
+if __name__ == "__main__":
+    # The program takes exactly one argument, the json report configuration.
+    parser = argparse.ArgumentParser()
+    parser.add_argument('json_file', help='the report configuration, see report/engine.py')
+    parser.add_argument('--trace', metavar='FILE',
+                        help='write a timeline of the steps of the run (Chrome trace format) and print a summary')
+    arguments = parser.parse_args()
+    trace_file = arguments.trace
+    if trace_file:
+        tracer = tracing.enable()
+
+    fp = open(arguments.json_file, "r")
+    data = json.load(fp)
+
+    spacekey = data['config'].get('spacekey', "<TEST SPACE KEY>")
+    engine = report.ReportEngine(get_jira_client(), get_confluence_client(spacekey), data)
+    with tracing.span("report"):
+        pages = engine.run()
+
+    if trace_file:
+        print(tracer.summary())
+        tracer.write_chrome_trace(trace_file)
+
+    for status in pages:
+        print_status(status)
@@ -1,2 +1,16 @@
-from jira_utils.processing_utils import *
-from jira_utils.client import *
\ No newline at end of file
+# The submodules pull in heavy dependencies (jira), so they are only imported
+# when one of their names is used for the first time.
+from lazy_import import make_lazy
+
+_lazy_names = {
+    'ProcessingUtils': 'jira_utils.processing_utils',
+    'Client': 'jira_utils.client',
+    'SprintMetrics': 'jira_utils.sprint_metrics',
+    'IssueSnapshot': 'jira_utils.snapshot',
+}
+
+_lazy_submodules = ['client', 'processing_utils', 'sprint_metrics', 'snapshot']
+
+__all__ = list(_lazy_names)
+
+make_lazy(__name__)
@@ -1,7 +1,6 @@
-import oauth2 as oauth
+import inspect
 import json
-import jira.client
-import urllib3
+import threading
 
 ##################################################################################
 # Python Interface for Confluence, supporting a subset of the full REST interface.
@@ -67,15 +66,32 @@ class Client:
             else:
                 timeout = None
 
-        self._wrapped_obj = obj = jira.client.JIRA(oauth=oauth, options=options, timeout=timeout)
+        # The connection is made on first use, so clients which are never used cost nothing.
+        self._jira_arguments = {'oauth': oauth, 'options': options, 'timeout': timeout}
+        self._jira = None
+        self._jira_lock = threading.Lock()
 
-    def __getattr__(self, attr):
-        # see if this object has attr
-        # NOTE do not use hasattr, it goes into
-        # infinite recurrsion
-        if attr in self.__dict__:
-            # this object has it
-            return getattr(self, attr)
-        # proxy to the wrapped object
-        return getattr(self._wrapped_obj, attr)
+    @property
+    def _wrapped_obj(self):
+        # Connect to the JIRA server the first time the wrapped object is needed
+        if self.__dict__.get('_jira') is None:
+            with self._jira_lock:
+                if self._jira is None:
+                    # jira is slow to import, so it is only loaded when a connection is made
+                    import jira.client
+
+                    self._jira = jira.client.JIRA(**self._jira_arguments)
+        return self._jira
 
+    def __getattr__(self, attr):
+        # Only called when the attribute is not found on this object, so proxy to the wrapped object.
+        # The names of this wrapper are never proxied, which also avoids infinite recursion before __init__
+        # has run. Private names of the wrapped object (e.g. _session or _get_json) are proxied like all others.
+        if attr in ('_jira', '_jira_arguments', '_jira_lock', '_wrapped_obj') or '_jira_arguments' not in self.__dict__:
+            raise AttributeError(attr)
+        value = getattr(self._wrapped_obj, attr)
+        if inspect.ismethod(value):
+            # Bound methods of the wrapped object never change, so cache them on this object
+            # where later lookups find them without coming here.
+            self.__dict__[attr] = value
+        return value
@@ -5,18 +5,40 @@
 import time
 import collections
 import math
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import traced
 from datetime import date
 from datetime import timedelta 
 
 class ProcessingUtils():
     name = 'Jira Processing'
 
+    def _snapshot_values(self, snapshot, fields, mask=None):
+        """ Return the set values of the given fields in an IssueSnapshot, optionally of the masked issues only.
+            Raises ValueError if none of the fields is in the snapshot.
+        """
+        import numpy as np
+
+        values = [snapshot.column(field) for field in fields if field in snapshot.fields]
+        if not values:
+            raise ValueError('The snapshot needs one of the fields ' + ', '.join(fields) + '...')
+        values = np.stack(values, axis=1)
+        if mask is not None:
+            values = values[mask]
+        return values[~np.isnan(values)]
+
     def create_sum_of_story_point_field(self, issues):
         """ This function takes a list of issues and summarize the values in the field customfield_10003(Story Point).
 
             Arguments:
                 issues: JIRA module return data from 'search_issues' function.
         """
+        if hasattr(issues, 'column'):
+            # An IssueSnapshot, sum the column directly
+            return float(self._snapshot_values(issues, ['customfield_10003']).sum())
+
         valueList = []
         
         for issue in issues:
@@ -32,6 +54,12 @@ class ProcessingUtils():
             Arguments:
                 issues: JIRA module return data from 'search_issues' function.
         """
+        if hasattr(issues, 'column'):
+            # An IssueSnapshot, sum the column directly
+            if 'issuetype' not in issues.fields:
+                raise ValueError('The snapshot needs the issuetype field to leave out epics...')
+            return float(self._snapshot_values(issues, ['customfield_10003'], ~issues.equals('issuetype', 'Epic')).sum())
+
         valueList = []
         
         for issue in issues:
@@ -48,6 +76,10 @@ class ProcessingUtils():
             Arguments:
                 issues: JIRA module return data from 'search_issues' function.
         """
+        if hasattr(issues, 'column'):
+            # An IssueSnapshot, sum the column directly
+            return float(self._snapshot_values(issues, ['timeoriginalestimate']).sum())
+
         valueList = []
         
         for issue in issues:
@@ -91,6 +123,11 @@ class ProcessingUtils():
         else:
             raise NameError('Department: ' + department + ' not found...')
         
+        if hasattr(issues, 'column'):
+            # An IssueSnapshot, sum the columns directly
+            values = self._snapshot_values(issues, depStr)
+            return float(values.sum()) if len(values) else float('NaN')
+
         valueList = []
         
         if not(isinstance(issues, collections.Iterable)):
@@ -162,6 +199,75 @@ class ProcessingUtils():
         
         return sprintName, sprintStart, sprintEnd
     
+    def _to_day_array(self, dates):
+        """ Convert dates to a NumPy datetime64[D] array. Accepted are datetime64 arrays, and sequences of
+            date/datetime objects, Jira date strings ('2017-06-09T15:00:00.000+0200') or None for no date.
+        """
+        import numpy as np
+
+        if isinstance(dates, np.ndarray) and np.issubdtype(dates.dtype, np.datetime64):
+            return dates.astype('datetime64[D]')
+        return np.array([day[:10] if isinstance(day, str) else day for day in dates], dtype='datetime64[D]')
+
+    def _calendar_table(self, dates, day_function, columns):
+        """ Apply day_function to every distinct day in dates only once, and spread the results back over
+            all the dates. Returns one array per value returned by day_function, with '' for missing dates.
+        """
+        import numpy as np
+
+        unique_days, inverse = np.unique(self._to_day_array(dates), return_inverse=True)
+        table = [day_function(day) if day is not None else ('',) * columns for day in unique_days.astype(object)]
+        if not table:
+            return tuple(np.array([], dtype=str) for _ in range(columns))
+        return tuple(np.array(column)[inverse.reshape(-1)] for column in zip(*table))
+
+    def get_two_week_sprint_names(self, dates):
+        """ Array version of get_two_week_sprint_name.
+            dates = many times, e.g. a NumPy datetime64 array or a list of dates. Returns arrays of sprint names,
+                    sprint starts and sprint ends.
+        """
+        return self._calendar_table(dates, self.get_two_week_sprint_name, 3)
+
+    def get_one_week_sprint_names(self, dates):
+        """ Array version of get_one_week_sprint_name.
+            dates = many times, e.g. a NumPy datetime64 array or a list of dates. Returns arrays of sprint names,
+                    sprint starts and sprint ends.
+        """
+        return self._calendar_table(dates, self.get_one_week_sprint_name, 3)
+
+    def get_cadence_fixversion_names(self, dates):
+        """ Array version of get_cadence_fixversion_name.
+            dates = many times, e.g. a NumPy datetime64 array or a list of dates. Returns arrays of fixversion
+                    names and release dates.
+        """
+        return self._calendar_table(dates, self.get_cadence_fixversion_name, 2)
+
+    @traced("sprint bucketing")
+    def group_issues_by_sprint(self, issues, dates, weeks=2):
+        """ This function sorts issues into the sprints their dates fall in.
+
+            Arguments:
+                issues: JIRA module return data from 'search_issues' function.
+                dates: the date of each issue (e.g. created or resolved date), same order as issues.
+                       Issues without a date are left out.
+                weeks: sprint length, 1 or 2 weeks.
+
+            Returns an ordered dictionary of sprint name to list of issues, in order of sprint start.
+        """
+        if weeks == 2:
+            names, starts, ends = self.get_two_week_sprint_names(dates)
+        elif weeks == 1:
+            names, starts, ends = self.get_one_week_sprint_names(dates)
+        else:
+            raise ValueError('Sprint length of ' + str(weeks) + ' weeks is not supported...')
+
+        sprints = dict()
+        for issue, name, start in zip(issues, names, starts):
+            if name:
+                sprints.setdefault((str(start), str(name)), []).append(issue)
+        return collections.OrderedDict((name, sprints[(start, name)]) for start, name in sorted(sprints))
+
+    @traced("jira search")
     def search_issues_all(self, jira_session, jqlStr, validate_query, fields, expand, json_result):
         """ the default search will not return more than 1000 items. This one return them all."""
       
@@ -188,4 +294,97 @@ class ProcessingUtils():
 
             items = items + searchResult
             
-        return items
\ No newline at end of file
+        return items
+
+    def _strip_order_by(self, jqlStr):
+        # Remove an ORDER BY clause, the keyset search needs its own ordering
+        return re.split(r'\s+order\s+by\s+', jqlStr, flags=re.IGNORECASE)[0].strip()
+
+    @traced("jira search")
+    def search_issues_keyset(self, jira_session, jqlStr, validate_query, fields, expand, pageSize=1000):
+        """ Like search_issues_all, but pages with 'key > last key' cursors in key order instead of growing
+            startAt offsets. Every page costs the same however deep the scan is, and issues changing during
+            the scan are neither missed nor returned twice. Any ORDER BY of jqlStr is replaced by key order.
+            JQL compares keys (and ids, which are the same clause) only within the project of the given key,
+            so the query is paged one project at a time: the first issue found names the next project, which
+            is then scanned to the end and left out of the following searches. Issues are returned by project.
+        """
+        jqlStr = self._strip_order_by(jqlStr)
+        items = [];
+        doneProjects = []
+        project = None
+        lastKey = None
+
+        while True:
+            if project is None:
+                # Find the next project holding matching issues
+                pageJql = '(' + jqlStr + ')'
+                if doneProjects:
+                    pageJql += ' AND project NOT IN (' + ', '.join('"' + done + '"' for done in doneProjects) + ')'
+            else:
+                pageJql = '(' + jqlStr + ') AND project = "' + project + '" AND key > "' + lastKey + '"'
+            searchResult = jira_session.search_issues(pageJql + ' ORDER BY key ASC',
+                                             startAt=0,
+                                             maxResults=pageSize,
+                                             validate_query=validate_query,
+                                             fields=fields,
+                                             expand=expand,
+                                             json_result=None)
+            if len(searchResult) == 0:
+                if project is None:
+                    break
+                # The last page of the project was full
+                doneProjects.append(project)
+                project = None
+                continue
+            firstPage = project is None
+            if firstPage:
+                project = searchResult[0].key.rsplit('-', 1)[0]
+            # Issues of other projects on a first page are fetched again with their own project
+            projectIssues = [issue for issue in searchResult if issue.key.rsplit('-', 1)[0] == project]
+            items.extend(projectIssues)
+            if len(searchResult) < pageSize:
+                if firstPage and len(projectIssues) == len(searchResult):
+                    # The page holds all remaining issues of the query
+                    break
+                doneProjects.append(project)
+                project = None
+            else:
+                lastKey = projectIssues[-1].key
+
+        return items
+
+    def split_jql_by_date(self, jqlStr, start, end, shards, field='created'):
+        """ Split a query into disjoint queries on date ranges of field, together returning the same issues.
+            The range from start to end (dates) is divided evenly, the first and last shards are open ended.
+            field must be a date that does not change while the shards are searched, like created. With a
+            changing field like updated, issues moving between shards are missed or returned twice.
+        """
+        jqlStr = self._strip_order_by(jqlStr)
+        step = (end - start) / shards
+        bounds = [(start + step * shard).strftime('"%Y/%m/%d %H:%M"') for shard in range(1, shards)]
+
+        queries = []
+        for shard in range(shards):
+            conditions = []
+            if shard > 0:
+                conditions.append(field + ' >= ' + bounds[shard - 1])
+            if shard < shards - 1:
+                conditions.append(field + ' < ' + bounds[shard])
+            queries.append(' AND '.join(['(' + jqlStr + ')'] + conditions))
+        return queries
+
+    @traced("jira search")
+    def search_issues_sharded(self, jira_session, jqlStr, start, end, shards, validate_query, fields, expand,
+                              pageSize=1000, maxWorkers=None):
+        """ Fetch all issues of a very large query by splitting it into date range shards (see split_jql_by_date)
+            searched in parallel with search_issues_keyset. Issues are returned in shard order.
+        """
+        queries = self.split_jql_by_date(jqlStr, start, end, shards)
+        with ThreadPoolExecutor(max_workers=maxWorkers or shards) as executor:
+            results = executor.map(lambda query: self.search_issues_keyset(jira_session, query, validate_query,
+                                                                          fields, expand, pageSize), queries)
+            items = [];
+            for result in results:
+                items.extend(result)
+        return items
@@ -0,0 +1,131 @@
+###################################
+## This module supplies a compact columnar on-disk snapshot of fetched issues. Numeric fields are stored as
+## typed arrays, dates as datetime64 arrays and text dictionary encoded. Snapshots are opened memory mapped,
+## so loading is next to free and processes analysing the same snapshot share its memory in the page cache.
+##
+###################################
+import json
+import os
+import re
+import shutil
+import tempfile
+
+import numpy as np
+
+_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}')
+
+
+def _text(value):
+    # The text of a raw Jira field value: the name of objects like status or issuetype, names joined for lists
+    if isinstance(value, dict):
+        for name in ('name', 'value', 'displayName', 'key'):
+            if name in value:
+                return str(value[name])
+        return json.dumps(value, sort_keys=True)
+    if isinstance(value, list):
+        return ", ".join(_text(item) for item in value)
+    return str(value)
+
+
+class IssueSnapshot():
+    def __init__(self, path):
+        """ Open the snapshot in the directory path, memory mapped.
+            All columns are mapped right away, so the snapshot stays whole when write replaces it later.
+        """
+        self._path = path
+        with open(os.path.join(path, "meta.json"), "r") as fp:
+            self._meta = json.load(fp)
+        self._columns = dict((name, np.load(os.path.join(path, name + ".npy"), mmap_mode='r'))
+                             for name in self._meta['columns'])
+
+    def __len__(self):
+        return self._meta['length']
+
+    @property
+    def fields(self):
+        return list(self._meta['columns'])
+
+    def column(self, name):
+        """ Return the array of a field: float64 for numbers (NaN if not set), datetime64[s] for dates
+            (NaT if not set) and int32 dictionary codes for text (-1 if not set), see strings.
+        """
+        if name not in self._columns:
+            raise KeyError('Field ' + name + ' is not in the snapshot ' + self._path)
+        return self._columns[name]
+
+    def kind(self, name):
+        """ Return 'number', 'date' or 'text' """
+        return self._meta['columns'][name]['kind']
+
+    def dictionary(self, name):
+        """ Return the distinct texts of a text field, indexed by the codes of column """
+        return self._meta['columns'][name]['dictionary']
+
+    def strings(self, name):
+        """ Return the values of a text field as an array of strings, None where not set """
+        dictionary = np.array(self.dictionary(name) + [None], dtype=object)
+        return dictionary[self.column(name)]
+
+    def equals(self, name, text):
+        """ Return a boolean array telling which issues have the given text in a text field """
+        dictionary = self.dictionary(name)
+        if text not in dictionary:
+            return np.zeros(len(self), dtype=bool)
+        return self.column(name) == dictionary.index(text)
+
+    @staticmethod
+    def write(path, issues, fields):
+        """ Write issues (JIRA module return data from 'search_issues') to a snapshot in the directory path.
+
+            Arguments:
+                fields: string of comma separated raw field ids to store. The issue key is always stored.
+            Returns the opened snapshot.
+            The snapshot is written to a new sibling directory, which then replaces path. Processes having the
+            old snapshot open keep reading its files, which are only unlinked.
+        """
+        path = os.path.abspath(path)
+        parent = os.path.dirname(path)
+        os.makedirs(parent, exist_ok=True)
+        new_path = tempfile.mkdtemp(prefix=os.path.basename(path) + ".", suffix=".new", dir=parent)
+        raws = [issue.raw['fields'] for issue in issues]
+        columns = {'key': [issue.key for issue in issues]}
+        for field in fields.split(','):
+            if field != 'key':
+                columns[field] = [raw.get(field) for raw in raws]
+
+        meta = {'length': len(raws), 'columns': dict()}
+        for name, values in columns.items():
+            present = [value for value in values if value is not None]
+            if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+                kind = 'number'
+                array = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+            elif present and all(isinstance(value, str) and _DATE.match(value) for value in present):
+                kind = 'date'
+                array = np.array(['NaT' if value is None else value[:19] for value in values], dtype='datetime64[s]')
+            else:
+                kind = 'text'
+                codes = dict()
+                array = np.array([-1 if value is None else codes.setdefault(_text(value), len(codes))
+                                  for value in values], dtype=np.int32)
+            meta['columns'][name] = {'kind': kind}
+            if kind == 'text':
+                meta['columns'][name]['dictionary'] = list(codes)
+            np.save(os.path.join(new_path, name + ".npy"), array)
+
+        # The meta data is written last, a snapshot is only complete when it is there
+        with open(os.path.join(new_path, "meta.json"), "w") as fp:
+            json.dump(meta, fp)
+        # mkdtemp makes the directory readable by the owner only
+        os.chmod(new_path, 0o755)
+
+        # A directory cannot replace a non-empty one, so the old snapshot is moved aside first
+        old_path = None
+        if os.path.exists(path):
+            old_path = tempfile.mkdtemp(prefix=os.path.basename(path) + ".", suffix=".old", dir=parent)
+            os.rmdir(old_path)
+            os.replace(path, old_path)
+        os.replace(new_path, path)
+        if old_path is not None:
+            # Files still mapped cannot be removed on Windows, they are then left behind
+            shutil.rmtree(old_path, ignore_errors=True)
+        return IssueSnapshot(path)
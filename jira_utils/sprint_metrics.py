@@ -0,0 +1,187 @@
+###################################
+## This module supplies per-sprint time series (velocity, scope change, remaining work) computed from the
+## changelogs of issues fetched with a single Jira query.
+##
+###################################
+from datetime import date
+from datetime import datetime
+from datetime import timedelta
+
+from jira_utils.processing_utils import ProcessingUtils
+
+
+class SprintMetrics():
+    name = 'Jira Sprint Metrics'
+
+    def __init__(self, story_point_field='customfield_10003', story_point_name='Story Points',
+                 estimate_field='timeoriginalestimate', done_statuses=None):
+        """ Arguments:
+                story_point_field: id of the story point custom field
+                story_point_name: name of the story point field as it appears in the changelog
+                estimate_field: id of the estimate field, counted in seconds
+                done_statuses: names of the statuses counting as done. If omitted, issues count as done
+                               while they have a resolution.
+        """
+        self._story_point_field = story_point_field
+        self._story_point_name = story_point_name
+        self._estimate_field = estimate_field
+        self._done_statuses = None if done_statuses is None else set(done_statuses)
+        self._processing = ProcessingUtils()
+        self.issues = []
+        # issue key -> {'points': [(time, value)], 'estimate': [...], 'status': [...], 'resolved': [...]}
+        self.histories = dict()
+
+    def fetch(self, jira_session, jqlStr):
+        """ Fetch all issues of the query with their changelogs in one go, and rebuild their histories. """
+        fields = ",".join(["created", "status", "resolution", self._story_point_field, self._estimate_field])
+        self.issues = self._processing.search_issues_all(jira_session, jqlStr,
+                                                         validate_query=True,
+                                                         fields=fields,
+                                                         expand="changelog",
+                                                         json_result=None)
+        self.histories = dict((issue.key, self._rebuild_history(issue)) for issue in self.issues)
+        return self.issues
+
+    def _number(self, value):
+        # Changelog values are strings, and empty when the field was not set
+        if value is None or value == '':
+            return 0.0
+        return float(value)
+
+    def _rebuild_history(self, issue):
+        """ Walk the changelog of an issue and return the list of (time, value) changes of the story points,
+            the estimate, the status and whether the issue is resolved, starting with the values at creation.
+        """
+        changes = {'points': [], 'estimate': [], 'status': [], 'resolved': []}
+        for history in sorted(issue.changelog.histories, key=lambda history: history.created):
+            for item in history.items:
+                field_id = getattr(item, 'fieldId', None)
+                if item.field == self._story_point_name or field_id == self._story_point_field:
+                    changes['points'].append((history.created, self._number(item.fromString),
+                                              self._number(item.toString)))
+                elif item.field == self._estimate_field or field_id == self._estimate_field:
+                    changes['estimate'].append((history.created, self._number(getattr(item, 'from')),
+                                                self._number(item.to)))
+                elif item.field == 'status':
+                    changes['status'].append((history.created, item.fromString, item.toString))
+                elif item.field == 'resolution':
+                    changes['resolved'].append((history.created, bool(item.fromString), bool(item.toString)))
+
+        current = {'points': self._number(getattr(issue.fields, self._story_point_field, None)),
+                   'estimate': self._number(getattr(issue.fields, self._estimate_field, None)),
+                   'status': issue.fields.status.name,
+                   'resolved': issue.fields.resolution is not None}
+        created = issue.fields.created
+        result = dict()
+        for name, values in changes.items():
+            # The value at creation is what the first change changed from, or the current value if never changed
+            initial = values[0][1] if values else current[name]
+            result[name] = [(created, initial)] + [(time, to) for time, _, to in values]
+        return result
+
+    def _done_history(self, history):
+        # The (time, done) changes of an issue, from its resolution or from its status
+        if self._done_statuses is None:
+            return history['resolved']
+        return [(time, status in self._done_statuses) for time, status in history['status']]
+
+    def _events(self, history, value_name):
+        """ Turn the history of an issue into (time, scope delta, done delta) events for one value """
+        events = []
+        timeline = sorted([(time, value_name, value) for time, value in history[value_name]] +
+                          [(time, 'resolved', value) for time, value in self._done_history(history)],
+                          key=lambda event: event[0])
+        state = {value_name: 0.0, 'resolved': False}
+        scope = done = 0.0
+        for time, name, value in timeline:
+            state[name] = value
+            new_scope = state[value_name]
+            new_done = new_scope if state['resolved'] else 0.0
+            if new_scope != scope or new_done != done:
+                events.append((time[:19], new_scope - scope, new_done - done))
+            scope, done = new_scope, new_done
+        return events
+
+    def _as_date(self, value):
+        # Dates may be given as date, datetime, datetime64 or 'yyyy-mm-dd...' strings
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        if isinstance(value, str):
+            return datetime.strptime(value[:10], "%Y-%m-%d").date()
+        return value.astype('datetime64[D]').astype(object)
+
+    def sprint_boundaries(self, first, last, weeks=2):
+        """ Return arrays of the sprint names, starts and ends of all sprints from the one holding the date first
+            to the one holding the date last. Starts and ends are datetime64 values.
+        """
+        import numpy as np
+
+        first = self._as_date(first)
+        last = self._as_date(last)
+        days = [first + timedelta(days=day) for day in range(0, (last - first).days + 1, 7)] + [last]
+        if weeks == 2:
+            names, starts, ends = self._processing.get_two_week_sprint_names(days)
+        elif weeks == 1:
+            names, starts, ends = self._processing.get_one_week_sprint_names(days)
+        else:
+            raise ValueError('Sprint length of ' + str(weeks) + ' weeks is not supported...')
+        names, index = np.unique(names, return_index=True)
+        order = np.argsort(starts[index])
+        as_time = np.vectorize(lambda text: text.replace('/', '-').replace(' ', 'T'))
+        return (names[order],
+                as_time(starts[index][order]).astype('datetime64[s]'),
+                as_time(ends[index][order]).astype('datetime64[s]'))
+
+    def series(self, first=None, last=None, weeks=2):
+        """ This function computes the per sprint series of the fetched issues in one pass over all changes.
+
+            Arguments:
+                first, last: dates of the first and last sprint. Defaults to the first change and today.
+                weeks: sprint length, 1 or 2 weeks.
+
+            Returns a dictionary of NumPy arrays, one value per sprint:
+                sprint, start, end: sprint name and boundaries
+                velocity: story points done during the sprint
+                scope_change: story points added to (or removed from) the issues during the sprint
+                scope, done, remaining: story points in total, resolved and not resolved at the end of the sprint
+                estimate_velocity, estimate_scope_change, estimate_scope, estimate_done, remaining_estimate:
+                    the same for the estimate, in seconds
+            Issues count from their creation, and stop counting as done if they are reopened (or leave the
+            done statuses).
+        """
+        import numpy as np
+
+        columns = {}
+        for value_name in ['points', 'estimate']:
+            events = [event for history in self.histories.values() for event in self._events(history, value_name)]
+            times = np.array([event[0] for event in events], dtype='datetime64[s]')
+            order = np.argsort(times, kind='stable')
+            times = times[order]
+            scope = np.cumsum(np.array([event[1] for event in events], dtype=float)[order])
+            done = np.cumsum(np.array([event[2] for event in events], dtype=float)[order])
+            columns[value_name] = (times, scope, done)
+
+        if first is None:
+            all_times = np.concatenate([columns['points'][0], columns['estimate'][0]])
+            first = all_times.min().astype('datetime64[D]').astype(object) if len(all_times) else date.today()
+        if last is None:
+            last = date.today()
+        names, starts, ends = self.sprint_boundaries(first, last, weeks)
+
+        result = {'sprint': names, 'start': starts, 'end': ends}
+        for value_name, prefix in [('points', ''), ('estimate', 'estimate_')]:
+            times, scope, done = columns[value_name]
+            # Values at a boundary are the running totals of all events before it
+            scope = np.concatenate([[0.0], scope])
+            done = np.concatenate([[0.0], done])
+            at_start = np.searchsorted(times, starts, side='left')
+            at_end = np.searchsorted(times, ends, side='left')
+            result[prefix + 'scope'] = scope[at_end]
+            result[prefix + 'done'] = done[at_end]
+            result[prefix + 'scope_change'] = scope[at_end] - scope[at_start]
+            result[prefix + 'velocity'] = done[at_end] - done[at_start]
+        result['remaining'] = result['scope'] - result['done']
+        result['remaining_estimate'] = result['estimate_scope'] - result['estimate_done']
+        return result
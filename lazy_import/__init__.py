@@ -0,0 +1 @@
+from lazy_import.lazy_module import *
@@ -0,0 +1,35 @@
+###################################
+## This module supplies lazily loading packages: names of a package are only imported from its submodules
+## when they are used for the first time, so importing the package itself costs next to nothing.
+##
+###################################
+import importlib
+import sys
+import types
+
+__all__ = ['LazyModule', 'make_lazy']
+
+
+class LazyModule(types.ModuleType):
+    # Attribute lookups the module does not have yet end up here. Unlike a module level __getattr__
+    # (Python 3.7 and later) this also works on Python 3.6.
+    # The package lists its lazy names in _lazy_names (name -> submodule) and its submodules in _lazy_submodules.
+    def __getattr__(self, name):
+        lazy_names = self.__dict__.get('_lazy_names', {})
+        if name in lazy_names:
+            value = getattr(importlib.import_module(lazy_names[name]), name)
+            setattr(self, name, value)
+            return value
+        if name in self.__dict__.get('_lazy_submodules', ()):
+            # Importing a submodule also sets it as an attribute of the package
+            return importlib.import_module(self.__name__ + "." + name)
+        raise AttributeError("module %r has no attribute %r" % (self.__name__, name))
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(self.__dict__.get('_lazy_names', {})) |
+                      set(self.__dict__.get('_lazy_submodules', ())))
+
+
+def make_lazy(module_name):
+    """ Make the already imported module module_name load its _lazy_names and _lazy_submodules on first use """
+    sys.modules[module_name].__class__ = LazyModule
@@ -0,0 +1 @@
+from report.engine import *
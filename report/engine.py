@@ -0,0 +1,181 @@
+###################################
+## This module supplies a report engine driven by a json configuration: Jira queries, tables and aggregations
+## made from them, and the Confluence pages they are published on. The steps are run as a dependency graph,
+## independent queries and renders in parallel, and every page is published as soon as its inputs are ready.
+##
+###################################
+from string import Template
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import confluence
+import jira_utils
+import tracing
+
+__all__ = ['ReportEngine']
+
+
+class ReportEngine():
+    """ The configuration extends the design review json file (config and variables) like this:
+        {
+          "config": {"parent_page_id": 61210633, "template_page_id": 61210645, "spacekey": "<SPACEKEY>"},
+          "variables": {"RELEASE_VERSION": "4.8.0"},
+          "queries": {
+            "stories": {"jql": "project=GEAR AND type=Story AND fixVersion=$RELEASE_VERSION",
+                        "fields": "key,type,summary,status,customfield_10003",
+                        "expand": "renderedFields", "max_results": 100}
+          },
+          "tables": {
+            "STORIES_DONE_TABLE": {"query": "stories", "fields": "key,type,summary,status", "titles": "Key,T,Summary,Status"}
+          },
+          "aggregations": {
+            "STORY_POINTS": {"query": "stories", "function": "create_sum_of_story_point_field"},
+            "SWS_SIZING": {"query": "stories", "function": "get_sizing", "arguments": {"department": "sws"}}
+          },
+          "pages": [
+            {"title": "Design Review - Release $RELEASE_VERSION", "labels": ["design-review"],
+             "variables": ["STORIES_DONE_TABLE", "STORY_POINTS"]}
+          ]
+        }
+        Queries without max_results fetch all issues. Queries with the same jql, fields and expand are fetched once.
+        Tables and aggregations become page variables named after them. Pages default to the parent and template
+        page of the config, and to depending on all tables and aggregations when no variables are listed.
+    """
+
+    # ProcessingUtils functions an aggregation may use
+    _aggregations = ['create_sum_of_story_point_field', 'create_sum_of_story_point_field_excl_epic',
+                     'create_sum_of_original_estimate_field', 'get_sizing']
+
+    def __init__(self, jira_session, confluence_client, report, max_workers=8):
+        """ Arguments:
+                jira_session: jira_utils.Client to run the queries with
+                confluence_client: confluence.Client of the space to publish in
+                report: the report configuration, see the class documentation
+                max_workers: maximum number of steps run at the same time
+        """
+        self._jira_session = jira_session
+        self._confluence_client = confluence_client
+        self._content_utils = confluence.ContentUtils(confluence_client)
+        self._processing_utils = jira_utils.ProcessingUtils()
+        self._report = report
+        self._config = report.get('config', {})
+        self._variables = report.get('variables', {})
+        self._max_workers = max_workers
+
+    def _substitute(self, text):
+        return Template(text).safe_substitute(self._variables)
+
+    def _build_graph(self):
+        """ Return a dictionary of step name -> (names of the steps it needs, function of their results) """
+        graph = dict()
+        queries = dict()
+        for name, query in self._report.get('queries', {}).items():
+            jql = self._substitute(query['jql'])
+            identity = (jql, query.get('fields'), query.get('expand'), query.get('max_results'))
+            if identity not in queries:
+                queries[identity] = 'query ' + name
+                graph['query ' + name] = ([], self._query_step(jql, query))
+            else:
+                # Same query as an earlier one, share its issues
+                graph['query ' + name] = ([queries[identity]], lambda issues: issues)
+
+        for name, table in self._report.get('tables', {}).items():
+            graph[name] = (['query ' + table['query']], self._table_step(table))
+
+        for name, aggregation in self._report.get('aggregations', {}).items():
+            if aggregation['function'] not in self._aggregations:
+                raise ValueError('Aggregation function ' + aggregation['function'] + ' is not supported...')
+            graph[name] = (['query ' + aggregation['query']], self._aggregation_step(aggregation))
+
+        variables = list(self._report.get('tables', {})) + list(self._report.get('aggregations', {}))
+        for number, page in enumerate(self._report.get('pages', [])):
+            template_page_id = str(page.get('template_page_id', self._config.get('template_page_id')))
+            template = 'template ' + template_page_id
+            if template not in graph:
+                graph[template] = ([], self._template_step(template_page_id))
+            needs = page.get('variables', variables)
+            graph['page %d' % number] = ([template] + needs, self._page_step(page, needs))
+
+        for name, (needs, function) in graph.items():
+            for need in needs:
+                if need not in graph:
+                    raise ValueError('Report step ' + name + ' needs ' + need + ' which is not configured...')
+        return graph
+
+    def _query_step(self, jql, query):
+        def step():
+            if 'max_results' in query:
+                return self._jira_session.search_issues(jql,
+                                                        startAt=0,
+                                                        maxResults=query['max_results'],
+                                                        validate_query=True,
+                                                        fields=query.get('fields'),
+                                                        expand=query.get('expand'),
+                                                        json_result=None)
+            return self._processing_utils.search_issues_all(self._jira_session, jql,
+                                                            validate_query=True,
+                                                            fields=query.get('fields'),
+                                                            expand=query.get('expand'),
+                                                            json_result=None)
+        return step
+
+    def _table_step(self, table):
+        def step(issues):
+            return self._content_utils.create_jira_issue_table(issues, table['fields'], table['titles']).decode('UTF-8')
+        return step
+
+    def _aggregation_step(self, aggregation):
+        def step(issues):
+            function = getattr(self._processing_utils, aggregation['function'])
+            return str(function(issues, **aggregation.get('arguments', {})))
+        return step
+
+    def _template_step(self, template_page_id):
+        def step():
+            return self._confluence_client.get_page_content(template_page_id)
+        return step
+
+    def _page_step(self, page, needs):
+        def step(template_page, *results):
+            substitutions = dict(self._variables)
+            substitutions.update(zip(needs, results))
+            body = Template(template_page).substitute(substitutions)
+            parent_page_id = str(page.get('parent_page_id', self._config.get('parent_page_id')))
+            with tracing.span("page creation"):
+                content = self._confluence_client.create_page(parent_page_id=parent_page_id,
+                                                              title=self._substitute(page['title']),
+                                                              body=body)
+            error = self._content_utils._response_error(content)
+            if error is not None:
+                raise RuntimeError("Confluence page " + self._substitute(page['title']) + " was not created!\n" + error)
+            if page.get('labels'):
+                self._content_utils.set_labels(page_id=self._content_utils.get_page_id(content),
+                                               labels=page['labels'])
+            return content
+        return step
+
+    def run(self):
+        """ Run the report. Returns the content returned by Confluence for every page, in configuration order. """
+        graph = self._build_graph()
+        results = dict()
+        running = dict()
+        waiting = dict(graph)
+
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            while waiting or running:
+                # Start every step whose inputs are all there
+                for name, (needs, function) in list(waiting.items()):
+                    if all(need in results for need in needs):
+                        del waiting[name]
+                        running[executor.submit(self._run_step, name, function,
+                                                [results[need] for need in needs])] = name
+                if not running:
+                    raise ValueError('Report steps ' + ', '.join(waiting) + ' depend on each other...')
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+
+        return [results['page %d' % number] for number in range(len(self._report.get('pages', [])))]
+
+    def _run_step(self, name, function, arguments):
+        with tracing.span(name):
+            return function(*arguments)
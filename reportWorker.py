@@ -0,0 +1,57 @@
+####################################################################################################
+##
+## This program runs the report worker, or submits a job to it. See worker/daemon.py.
+##
+##   reportWorker.py serve [--port <port>] [<space key> ...]
+##       Start the worker, connecting to Jira and to Confluence for the given spaces right away.
+##   reportWorker.py submit [--port <port>] report|design-review <json file>
+##       Run a report (see createReport.py) or design review (see createDesignReview.py) in the worker.
+##   reportWorker.py submit [--port <port>] shutdown
+##       Stop the worker.
+##
+####################################################################################################
+import argparse
+import json
+
+import worker
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    modes = parser.add_subparsers(dest='mode')
+    modes.required = True
+    serve = modes.add_parser('serve', help='start the worker')
+    serve.add_argument('--port', type=int, default=worker.DEFAULT_PORT)
+    serve.add_argument('spacekeys', nargs='*', metavar='space key', help='Confluence spaces to connect to right away')
+    submit = modes.add_parser('submit', help='submit a job to the worker')
+    submit.add_argument('--port', type=int, default=worker.DEFAULT_PORT)
+    submit.add_argument('job', choices=['report', 'design-review', 'shutdown'])
+    submit.add_argument('json_file', nargs='?', help='the report or design review configuration')
+    arguments = parser.parse_args()
+
+    if arguments.mode == 'serve':
+        from createDesignReview import get_jira_client, get_confluence_client
+
+        daemon = worker.WorkerDaemon(get_jira_client, get_confluence_client, port=arguments.port)
+        daemon.warm_up(spacekeys=arguments.spacekeys)
+        daemon.serve_forever()
+
+    elif arguments.job == 'shutdown':
+        if arguments.json_file is not None:
+            submit.error('shutdown takes no json file')
+        print(worker.submit_job({'job': 'shutdown'}, port=arguments.port))
+
+    else:
+        from createDesignReview import print_status
+
+        if arguments.json_file is None:
+            submit.error(arguments.job + ' needs a json file')
+        fp = open(arguments.json_file, "r")
+        data = json.load(fp)
+        if arguments.job == 'report':
+            pages = worker.submit_job({'job': 'report', 'report': data}, port=arguments.port)
+        else:
+            pages = [worker.submit_job({'job': 'design-review', 'config': data['config'],
+                                        'variables': data['variables']}, port=arguments.port)]
+        for status in pages:
+            print_status(status.encode("utf-8"))
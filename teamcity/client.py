@@ -1,6 +1,8 @@
 import json
 import requests
 
+from concurrency import SingleFlight
+
 ##################################################################################
 # Python Interface for Confluence, supporting a subset of the full REST interface.
 #
@@ -14,12 +16,18 @@ class Client:
     
     _guestServerUrl = "http://<MY TEAMCITY INSTANCE>/guestAuth/app/rest/"
 
+    # Identical GET requests made at the same time from several threads share one request
+    _single_flight = SingleFlight()
+
+    def _get(self, uri):
+        return self._single_flight.do(uri, lambda: requests.get(uri, headers=self._headers))
+
 
           
     def getBuild(self, buildID):
         
         uri = self._guestServerUrl+"builds?locator=buildType:(id:" + buildID + "),running:any&fields=count,build(status)"
-        resp = requests.get(uri, headers=self._headers)
+        resp = self._get(uri)
         data = json.loads(resp.content.decode("utf-8"))
         return data['build']
            
@@ -28,21 +36,21 @@ class Client:
         
         uri = self._guestServerUrl+"buildTypes?locator=affectedProject:(id:"+ projectID+")&fields=buildType(id,name,builds($locator(running:false,canceled:false,count:1),build(number,status,statusText)))"
         
-        resp = requests.get(uri, headers=self._headers)
+        resp = self._get(uri)
         data = json.loads(resp.content.decode("utf-8"))
         return data['buildType']
     
     def getLatestBuild(self, buildID):
         
         uri = self._guestServerUrl+"buildTypes/id:"+ buildID+"/builds?count=1"
-        resp = requests.get(uri, headers=self._headers)
+        resp = self._get(uri)
         data = json.loads(resp.content.decode("utf-8"))
         return data['build']
     
     def getProjectBuilds(self, projectID):
         
         uri = self._guestServerUrl+"projects/id:" + projectID        
-        resp = requests.get(uri, headers=self._headers)
+        resp = self._get(uri)
         data = json.loads(resp.content.decode("utf-8"))
         buildtype = data['buildTypes'];
         buildtype = data['buildTypes'];
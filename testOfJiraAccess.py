@@ -32,4 +32,6 @@ if __name__ == "__main__":
     jira_session = jira_utils.Client(jsonOAuthFile="./jiraOAuth.json",
                                      options=options)
     print(jira_session)
+    # The client connects on first use, so ask the server for something to actually test the access
+    print(jira_session.server_info())
     print("done...")
\ No newline at end of file
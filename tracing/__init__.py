@@ -0,0 +1 @@
+from tracing.tracer import *
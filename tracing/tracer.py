@@ -0,0 +1,142 @@
+###################################
+## This module supplies a lightweight span tracer, telling where the time of a script run goes.
+## Tracing is off until enable() is called, and spans then cost next to nothing.
+##
+###################################
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+
+__all__ = ['Tracer', 'enable', 'get_tracer', 'span', 'traced']
+
+
+class Tracer():
+    def __init__(self, profile_dir=None, profile_depth=1):
+        """ Arguments:
+                profile_dir: if given, a cProfile dump is written to this directory for every span at
+                             profile_depth, named after the span.
+                profile_depth: nesting depth of the profiled spans within their thread. The default of 1 profiles
+                               the phases inside a span wrapping the whole run, 0 the outermost span of a thread.
+        """
+        self._profile_dir = profile_dir
+        self._profile_depth = profile_depth
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._start = time.perf_counter()
+        # (name, start, duration, thread id, args) of all finished spans, times in seconds
+        self._spans = []
+        self._profiles = 0
+
+    def span(self, name, **args):
+        """ Context manager timing the code inside it as a span called name. args are shown in the trace. """
+        return _Span(self, name, args)
+
+    def _begin(self, span):
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        if self._profile_dir is not None and depth == self._profile_depth:
+            span.profile = cProfile.Profile()
+            span.profile.enable()
+        span.start = time.perf_counter()
+
+    def _end(self, span):
+        end = time.perf_counter()
+        if span.profile is not None:
+            span.profile.disable()
+        self._local.depth -= 1
+        with self._lock:
+            self._spans.append((span.name, span.start - self._start, end - span.start, threading.get_ident(),
+                                span.args))
+            self._profiles += span.profile is not None
+            number = self._profiles
+        if span.profile is not None:
+            os.makedirs(self._profile_dir, exist_ok=True)
+            file_name = "%03d-%s.prof" % (number, "".join(c if c.isalnum() else "_" for c in span.name))
+            span.profile.dump_stats(os.path.join(self._profile_dir, file_name))
+
+    def write_chrome_trace(self, path):
+        """ Write the spans in the Chrome trace event format, to be opened in chrome://tracing or Perfetto """
+        with self._lock:
+            events = [{'name': name, 'ph': 'X', 'ts': start * 1e6, 'dur': duration * 1e6,
+                       'pid': os.getpid(), 'tid': thread, 'args': args}
+                      for name, start, duration, thread, args in self._spans]
+        with open(path, "w") as fp:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, fp, indent=1)
+
+    def summary(self):
+        """ Return a table of the span names with their count, total, mean and max time, largest total first """
+        totals = dict()
+        with self._lock:
+            for name, start, duration, thread, args in self._spans:
+                count, total, longest = totals.get(name, (0, 0.0, 0.0))
+                totals[name] = (count + 1, total + duration, max(longest, duration))
+
+        lines = ["%-40s %6s %12s %12s %12s" % ("span", "count", "total [ms]", "mean [ms]", "max [ms]")]
+        for name, (count, total, longest) in sorted(totals.items(), key=lambda item: -item[1][1]):
+            lines.append("%-40s %6d %12.1f %12.1f %12.1f" % (name, count, total * 1000, total * 1000 / count,
+                                                            longest * 1000))
+        return "\n".join(lines)
+
+
+class _Span():
+    __slots__ = ('tracer', 'name', 'args', 'start', 'profile')
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.profile = None
+
+    def __enter__(self):
+        self.tracer._begin(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.tracer._end(self)
+        return False
+
+
+class _NoSpan():
+    # Used while tracing is off
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_no_span = _NoSpan()
+_tracer = None
+
+
+def enable(profile_dir=None, profile_depth=1):
+    """ Start tracing the spans of the whole program. Returns the Tracer collecting them. """
+    global _tracer
+    _tracer = Tracer(profile_dir=profile_dir, profile_depth=profile_depth)
+    return _tracer
+
+
+def get_tracer():
+    """ Return the Tracer collecting the spans, or None while tracing is off """
+    return _tracer
+
+
+def span(name, **args):
+    """ Context manager timing the code inside it as a span called name, when tracing is on """
+    if _tracer is None:
+        return _no_span
+    return _tracer.span(name, **args)
+
+
+def traced(name):
+    """ Decorator making a span called name of every call of the decorated function """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1 @@
+from worker.daemon import *
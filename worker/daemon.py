@@ -0,0 +1,210 @@
+###################################
+## This module supplies a long running worker keeping authenticated Jira, Confluence and TeamCity clients warm,
+## and running report jobs submitted over a local socket. Build steps then only pay for the job itself, not for
+## starting Python, importing the libraries, reading the key files and connecting.
+##
+## Protocol: the client sends one json job on a single line, the worker answers with one json line:
+##   {"job": "report", "report": {...}}                          -> see report.ReportEngine for the format
+##   {"job": "design-review", "config": {...}, "variables": {...}} -> see createDesignReview.py
+##   {"job": "teamcity", "method": "getLatestBuild", "arguments": ["<build id>"]}
+##   {"job": "shutdown"}
+## Answers are {"status": "ok", "result": ...} or {"status": "error", "message": "..."}.
+##
+## Every job also carries a "token", which the worker writes to a file only its user can read when it starts.
+## Other local users can connect to the port, but not run jobs or shut the worker down.
+##
+## Jobs run on a fixed pool of threads living as long as the worker. The Confluence client keeps one connection
+## per thread, so the job threads keep theirs between jobs, and warm_up connects every one of them. What still
+## connects anew: every POST (the Confluence client signs each with a new client), and requests made from the
+## short lived thread pools of a job, like the parallel steps of a report.
+###################################
+import binascii
+import hmac
+import json
+import os
+import socket
+import socketserver
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+__all__ = ['WorkerDaemon', 'submit_job', 'DEFAULT_PORT', 'DEFAULT_TOKEN_FILE']
+
+DEFAULT_PORT = 8765
+DEFAULT_TOKEN_FILE = os.path.join(os.path.expanduser("~"), ".reportWorker.token")
+
+
+def _decode(content):
+    # Confluence returns bytes, which are sent back as text
+    if isinstance(content, bytes):
+        return content.decode("utf-8")
+    if isinstance(content, list):
+        return [_decode(item) for item in content]
+    return content
+
+
+class _JobHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        try:
+            job = json.loads(line.decode("utf-8"))
+            if not hmac.compare_digest(str(job.pop('token', '')), self.server.token):
+                raise PermissionError('The job token is not valid...')
+            answer = {'status': 'ok', 'result': _decode(self.server.daemon.run_job(job))}
+        except Exception as error:
+            traceback.print_exc()
+            answer = {'status': 'error', 'message': str(error)}
+        self.wfile.write((json.dumps(answer) + "\n").encode("utf-8"))
+
+
+class _Server(socketserver.TCPServer):
+    # Requests are handled on the job threads of the worker, instead of a new thread per request
+    allow_reuse_address = True
+
+    def __init__(self, server_address, handler, executor):
+        socketserver.TCPServer.__init__(self, server_address, handler)
+        self.executor = executor
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def _write_token(token_file):
+    # Make a new random token, readable by the current user only
+    token = binascii.hexlify(os.urandom(32)).decode("ascii")
+    fd = os.open(token_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    # A file left by an earlier worker keeps its permissions when opened, so they are set again
+    os.chmod(token_file, 0o600)
+    with os.fdopen(fd, "w") as fp:
+        fp.write(token)
+    return token
+
+
+class WorkerDaemon():
+    # TeamCity client methods a teamcity job may call
+    _teamcity_methods = ['getBuild', 'getLatestBuild', 'getLatestProjectBuilds', 'getProjectBuilds']
+
+    def __init__(self, get_jira_client, get_confluence_client, port=DEFAULT_PORT, token_file=DEFAULT_TOKEN_FILE,
+                 max_jobs=4):
+        """ Arguments:
+                get_jira_client: function returning a new jira_utils.Client
+                get_confluence_client: function of a space key returning a new confluence.Client
+                port: port on localhost to accept jobs on
+                token_file: file the job token is written to, readable by the current user only
+                max_jobs: number of job threads, the maximum number of jobs running at the same time
+        """
+        self._get_jira_client = get_jira_client
+        self._get_confluence_client = get_confluence_client
+        self._port = port
+        self._token_file = token_file
+        self._lock = threading.Lock()
+        self._jira_session = None
+        # space key -> confluence.Client
+        self._confluence_sessions = dict()
+        self._teamcity_session = None
+        self._server = None
+        self._max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_jobs)
+
+    def jira_session(self):
+        with self._lock:
+            if self._jira_session is None:
+                self._jira_session = self._get_jira_client()
+            return self._jira_session
+
+    def confluence_session(self, spacekey):
+        with self._lock:
+            if spacekey not in self._confluence_sessions:
+                self._confluence_sessions[spacekey] = self._get_confluence_client(spacekey)
+            return self._confluence_sessions[spacekey]
+
+    def teamcity_session(self):
+        import teamcity
+
+        with self._lock:
+            if self._teamcity_session is None:
+                self._teamcity_session = teamcity.Client()
+            return self._teamcity_session
+
+    def warm_up(self, spacekeys=()):
+        """ Import the libraries and make the clients now, instead of on the first job.
+            The clients connect lazily, so a first request is made to connect them. Confluence is connected
+            on every job thread, as each has its own connection.
+        """
+        import report
+        import createDesignReview
+
+        self.jira_session().server_info()
+        self.teamcity_session()
+
+        # Every job thread waits for the others, so each of them runs exactly one of the tasks
+        barrier = threading.Barrier(self._max_jobs)
+
+        def connect():
+            barrier.wait()
+            for spacekey in spacekeys:
+                self.confluence_session(spacekey).get_space()
+
+        for job in [self._executor.submit(connect) for _ in range(self._max_jobs)]:
+            job.result()
+
+    def run_job(self, job):
+        """ Run a job (see the module documentation) with the warm clients and return its result """
+        kind = job.get('job')
+        if kind == 'report':
+            import report
+
+            spacekey = job['report']['config'].get('spacekey', "<TEST SPACE KEY>")
+            engine = report.ReportEngine(self.jira_session(), self.confluence_session(spacekey), job['report'])
+            return engine.run()
+        if kind == 'design-review':
+            import createDesignReview
+
+            spacekey = job['config'].get('spacekey', "<TEST SPACE KEY>")
+            return createDesignReview.create_design_review_page(config=job['config'],
+                                                                variables=job['variables'],
+                                                                jira_session=self.jira_session(),
+                                                                confluence_session=self.confluence_session(spacekey))
+        if kind == 'teamcity':
+            if job.get('method') not in self._teamcity_methods:
+                raise ValueError('TeamCity method ' + str(job.get('method')) + ' is not supported...')
+            return getattr(self.teamcity_session(), job['method'])(*job.get('arguments', []))
+        if kind == 'shutdown':
+            # shutdown() waits for serve_forever to return, so it cannot be called from a job thread itself
+            threading.Thread(target=self._server.shutdown).start()
+            return "shutting down"
+        raise ValueError('Job ' + str(kind) + ' is not supported...')
+
+    def serve_forever(self):
+        """ Accept jobs on localhost until a shutdown job arrives. Up to max_jobs jobs run in parallel. """
+        self._server = _Server(("127.0.0.1", self._port), _JobHandler, self._executor)
+        self._server.daemon = self
+        self._server.token = _write_token(self._token_file)
+        print("Report worker waiting for jobs on port %d" % self._port)
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self._executor.shutdown(wait=False)
+
+
+def submit_job(job, port=DEFAULT_PORT, timeout=None, token_file=DEFAULT_TOKEN_FILE):
+    """ Send a job to the worker on localhost and return its result. Errors of the job are raised as RuntimeError.
+        The job token is read from the token_file written by the worker.
+    """
+    with open(token_file, "r") as fp:
+        job = dict(job, token=fp.read().strip())
+    with socket.create_connection(("127.0.0.1", port), timeout=timeout) as connection:
+        connection.sendall((json.dumps(job) + "\n").encode("utf-8"))
+        answer = json.loads(connection.makefile("rb").readline().decode("utf-8"))
+    if answer['status'] != 'ok':
+        raise RuntimeError("Report worker job failed!\n" + answer['message'])
+    return answer['result']